@@ -1,18 +1,20 @@
 import os
+import re
 import json
 import asyncio
+from contextlib import asynccontextmanager
 from pathlib import Path
-from typing import Optional, Dict, List
+from typing import Optional, Dict, Iterable, List, Tuple
 
 import httpx
 import pandas as pd
-from playwright.async_api import async_playwright, Browser, BrowserContext, Page
+from playwright.async_api import async_playwright, Browser, BrowserContext, Page, TimeoutError as PlaywrightTimeoutError
 from tenacity import retry, stop_after_attempt, wait_exponential, retry_if_exception_type
 
-from utils import logger, storage_state_to_cookie_header, ensure_dir
-from gsheets import sync_to_sheets_with_audit, get_sheets_service
+from utils import logger, storage_state_to_cookie_header, ensure_dir, prefetch_file, AdmissionController, AsyncTokenBucket
+from gsheets import sync_to_sheets_with_audit, get_sheets_service, get_sheet_titles
 from gdrive import DriveClient
-from pdf_to_json import pdf_to_json
+from pdf_to_json import pdf_to_json_async
 
 TMP_DIR = Path('/tmp')
 EXPORT_DIR = TMP_DIR / 'dashboard_exports'
@@ -25,9 +27,22 @@ CANDIDATE_DELAY = float(os.getenv('CANDIDATE_PROCESS_DELAY', '0.5'))  # Delay be
 DOCUMENT_DELAY = float(os.getenv('DOCUMENT_DOWNLOAD_DELAY', '0.3'))  # Delay between documents (seconds)
 MAX_CONCURRENT_CANDIDATES = int(os.getenv('MAX_CONCURRENT_CANDIDATES', '5'))  # Concurrent candidate processing
 MAX_CONCURRENT_DOCUMENTS = int(os.getenv('MAX_CONCURRENT_DOCUMENTS', '3'))  # Concurrent document downloads per candidate
-
-
-async def upload_existing_to_sheets(spreadsheet_id: str):
+MAX_CONCURRENT_UPLOADS = int(os.getenv('MAX_CONCURRENT_UPLOADS', '4'))  # Concurrent Drive uploads per candidate
+PW_RESTART_EVERY = int(os.getenv('PW_RESTART_EVERY', '50'))  # Relaunch Chromium after this many candidate contexts
+LINKS_READY_TIMEOUT_MS = int(os.getenv('LINKS_READY_TIMEOUT_MS', '10000'))  # Max wait for PIF/document links on a Playwright profile page
+
+CHROMIUM_ARGS = [
+    '--no-sandbox',
+    '--disable-setuid-sandbox',
+    '--disable-dev-shm-usage',
+    '--no-zygote',
+    '--js-flags=--max-old-space-size=512',
+]
+
+
+async def upload_existing_to_sheets(spreadsheet_id: str, frames: Optional[Dict[str, pd.DataFrame]] = None):
+    """Sync tab exports to Sheets, using already-parsed frames where given and the xlsx files otherwise"""
+    frames = frames or {}
     tabs = [
         "Today's allocated",
         "Not started",
@@ -40,15 +55,26 @@ async def upload_existing_to_sheets(spreadsheet_id: str):
     existing = []
     for t in tabs:
         fp = EXPORT_DIR / f"{t}.xlsx"
-        if fp.exists():
+        if t in frames:
+            existing.append((t, frames[t]))
+        elif fp.exists():
             existing.append((t, fp))
     if not existing:
         raise ValueError(f"No Excel files in {EXPORT_DIR}")
 
+    # One metadata fetch per run tells every tab whether the Audit Log sheet exists. It runs on
+    # this thread like the rest of the sync: the cached Sheets service shares one httplib2.Http,
+    # which is not thread-safe
+    try:
+        sheet_titles = get_sheet_titles(spreadsheet_id)
+    except Exception as e:
+        logger.warning(f"Could not list sheets, each tab will check on its own: {e}")
+        sheet_titles = None
+
     results = []
-    for tab, fp in existing:
+    for tab, source in existing:
         try:
-            r = await sync_to_sheets_with_audit(tab, fp, spreadsheet_id)
+            r = await sync_to_sheets_with_audit(tab, source, spreadsheet_id, sheet_titles)
             results.append(r)
         except Exception as e:
             logger.exception(f"Sync failed for {tab}: {e}")
@@ -56,85 +82,210 @@ async def upload_existing_to_sheets(spreadsheet_id: str):
     return {"ok": True, "tab_results": results}
 
 
+def collect_unique_candidates(frames: Iterable[pd.DataFrame]) -> List[Dict]:
+    """First CandidateID/CandidateName seen per ID across exported tab frames, built in one pass"""
+    unique: Dict[str, Dict] = {}
+    for df in frames:
+        if 'CandidateID' not in df.columns:
+            continue
+        df = df[df['CandidateID'].notna()]
+        ids = df['CandidateID'].astype(str).values
+        name_col = next((c for c in ('CandidateName', 'Name') if c in df.columns), None)
+        if name_col:
+            names = df[name_col].fillna('').astype(str).replace('', 'Unknown').values
+        else:
+            names = ['Unknown'] * len(ids)
+        for cid, name in zip(ids, names):
+            if cid:
+                unique.setdefault(cid, {'CandidateID': cid, 'CandidateName': name})
+    return list(unique.values())
+
+
+TAB_KEYWORDS = {
+    "Today's allocated": ["today", "todays", "allocated"],
+    "Not started": ["notstarted", "not-started", "not_started"],
+    "Draft": ["draft"],
+    "Rejected / Insufficient": ["rejected", "insufficient"],
+    "Submitted": ["submitted"],
+    "Work in progress": ["workinprogress", "work-in-progress", "inprogress"],
+    "BGV closed": ["bgvclosed", "closed"],
+}
+TAB_PATTERNS = {
+    tab: re.compile('|'.join(map(re.escape, keywords)), re.IGNORECASE)
+    for tab, keywords in TAB_KEYWORDS.items()
+}
+
+
 def resolve_endpoint_for_tab(tab: str, api_map: Optional[Dict]) -> Optional[str]:
-    if not api_map:
+    pattern = TAB_PATTERNS.get(tab)
+    if not api_map or pattern is None:
         return None
-    patterns = {
-        "Today's allocated": ["today", "todays", "allocated"],
-        "Not started": ["notstarted", "not-started", "not_started"],
-        "Draft": ["draft"],
-        "Rejected / Insufficient": ["rejected", "insufficient"],
-        "Submitted": ["submitted"],
-        "Work in progress": ["workinprogress", "work-in-progress", "inprogress"],
-        "BGV closed": ["bgvclosed", "closed"],
-    }
     export_dict = api_map.get('exportEndpoints', {}) if isinstance(api_map, dict) else {}
     for path_key, info in export_dict.items():
-        p = (info.get('path') or path_key or '').lower()
-        if any(k in p for k in patterns.get(tab, [])):
+        if pattern.search(info.get('path') or path_key or ''):
             return info.get('path') or path_key
     for ep in api_map.get('endpoints', []):
-        p = (ep.get('path') or '').lower()
-        if any(k in p for k in patterns.get(tab, [])):
+        if pattern.search(ep.get('path') or ''):
             return ep.get('path')
     return None
 
 
 @retry(reraise=True, stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=2, max=10), retry=retry_if_exception_type(Exception))
-async def fetch_binary(client: httpx.AsyncClient, url: str, headers: Dict) -> bytes:
-    r = await client.get(url, headers=headers, timeout=240)
-    r.raise_for_status()
-    return r.content
+async def fetch_binary_to_file(client: httpx.AsyncClient, url: str, headers: Dict, dest: Path) -> int:
+    """Stream a response body to dest in chunks and return the number of bytes written.
+
+    The body goes to a sibling temp file that replaces dest only once complete, so a
+    failed download leaves any previous dest intact and readers never see a partial file.
+    """
+    size = 0
+    tmp = dest.with_name(f"{dest.name}.part")
+    try:
+        async with client.stream("GET", url, headers=headers, timeout=240) as r:
+            r.raise_for_status()
+            with tmp.open('wb') as f:
+                async for chunk in r.aiter_bytes(65536):
+                    f.write(chunk)
+                    size += len(chunk)
+        os.replace(tmp, dest)
+    except Exception:
+        tmp.unlink(missing_ok=True)
+        raise
+    return size
 
 
-async def export_tab_via_api(tab: str, base_url: str, headers: Dict, api_map: Optional[Dict]) -> Dict:
-    endpoint = resolve_endpoint_for_tab(tab, api_map)
+async def export_tab_via_api(client: httpx.AsyncClient, tab: str, base_url: str, headers: Dict, endpoint: Optional[str]) -> Tuple[Dict, pd.DataFrame]:
+    """Download a tab's xlsx export and parse it once; the file is kept on disk for /upload-to-sheets"""
     file_path = EXPORT_DIR / f"{tab}.xlsx"
     if endpoint:
         url = f"{base_url}{endpoint}"
     else:
         url = f"{base_url}/api/export/TabData?tabName={tab.replace(' ', '%20')}"
-    async with httpx.AsyncClient() as client:
-        data = await fetch_binary(client, url, headers)
-        file_path.write_bytes(data)
-    if file_path.stat().st_size < 100:
+    size = await fetch_binary_to_file(client, url, headers, file_path)
+    if size < 100:
         raise RuntimeError(f"Downloaded file too small for {tab}")
-    return {"tab": tab, "status": "done", "file_size": file_path.stat().st_size, "method": "api"}
-
-
-async def resolve_document_endpoint(candidate_id: str, doc_type: str, api_map: Optional[Dict]) -> Optional[str]:
-    """Resolve document endpoint from API map or use default pattern"""
-    if api_map and isinstance(api_map, dict):
-        doc_endpoints = api_map.get('documentEndpoints', {})
-        for path_key, info in doc_endpoints.items():
-            path_lower = (info.get('path') or path_key or '').lower()
-            if doc_type.lower() in path_lower or candidate_id.lower() in path_lower:
-                return info.get('path') or path_key
-    return None
+    df = await asyncio.to_thread(pd.read_excel, file_path)
+    return {"tab": tab, "status": "done", "file_size": size, "method": "api"}, df
 
 
-async def download_document_via_api(client: httpx.AsyncClient, base_url: str, headers: Dict, candidate_id: str, doc_id: str, doc_name: str, api_map: Optional[Dict]) -> Optional[bytes]:
-    """Download a document via API, trying multiple endpoint patterns"""
+async def download_document_via_api(client: httpx.AsyncClient, base_url: str, headers: Dict, candidate_id: str, doc_id: str, doc_name: str, dest: Path) -> Optional[int]:
+    """Download a document via API into dest, trying multiple endpoint patterns; returns bytes written"""
     endpoints_to_try = [
-        resolve_document_endpoint(candidate_id, doc_id, api_map),
         f"/api/document/{candidate_id}/{doc_id}",
         f"/api/candidate/{candidate_id}/document/{doc_id}",
         f"/api/candidate/{candidate_id}/documents/{doc_id}/download",
     ]
     
     for endpoint in endpoints_to_try:
-        if not endpoint:
-            continue
         try:
             url = f"{base_url}{endpoint}" if not endpoint.startswith('http') else endpoint
-            return await fetch_binary(client, url, headers)
+            return await fetch_binary_to_file(client, url, headers, dest)
         except Exception as e:
             logger.debug(f"API endpoint {endpoint} failed: {e}")
             continue
     return None
 
 
-async def process_candidate_via_playwright(page: Page, candidate: Dict, base_url: str, drive: DriveClient, parent_folder: str) -> Dict:
+async def upload_candidate_files(drive: DriveClient, folder_id: str, local_dir: Path):
+    """Upload details, PIF and documents from a candidate's local dir to its Drive folder concurrently"""
+    uploads = [(local_dir / 'details.json', 'application/json')]
+    pif_pdf_path = local_dir / 'pif.pdf'
+    if pif_pdf_path.exists():
+        uploads.append((pif_pdf_path, 'application/pdf'))
+        pif_json_path = local_dir / 'pif.json'
+        if pif_json_path.exists():
+            uploads.append((pif_json_path, 'application/json'))
+    documents_dir = local_dir / 'documents'
+    if documents_dir.exists():
+        for doc_file in documents_dir.iterdir():
+            if doc_file.is_file():
+                mime_type = 'application/pdf' if doc_file.suffix == '.pdf' else 'application/octet-stream'
+                uploads.append((doc_file, mime_type))
+
+    semaphore = asyncio.Semaphore(MAX_CONCURRENT_UPLOADS)
+
+    async def upload_one(path: Path, mime_type: str) -> str:
+        async with semaphore:
+            return await drive.upload_file(folder_id, str(path), mime_type)
+
+    await asyncio.gather(*(upload_one(path, mime_type) for path, mime_type in uploads))
+
+
+class SharedBrowser:
+    """Chromium shared by Playwright fallbacks, relaunched every `restart_every` contexts.
+
+    Long-lived browsers accumulate memory across contexts, so after `restart_every`
+    contexts, or as soon as Chromium has disconnected, new candidates get a fresh
+    browser and the old one is closed once its last in-flight context is released.
+    """
+
+    def __init__(self, playwright, restart_every: int = PW_RESTART_EVERY):
+        self.playwright = playwright
+        self.restart_every = max(restart_every, 1)
+        self._browser: Optional[Browser] = None
+        self._contexts_since_restart = 0
+        self._active: Dict[Browser, int] = {}
+        self._lock = asyncio.Lock()
+
+    async def _acquire(self) -> Browser:
+        async with self._lock:
+            if (
+                self._browser is None
+                or self._contexts_since_restart >= self.restart_every
+                or not self._browser.is_connected()
+            ):
+                retired = self._browser
+                self._browser = await self.playwright.chromium.launch(headless=True, args=CHROMIUM_ARGS)
+                self._active[self._browser] = 0
+                self._contexts_since_restart = 0
+                if retired is not None and self._active[retired] == 0:
+                    del self._active[retired]
+                    await retired.close()
+            self._contexts_since_restart += 1
+            self._active[self._browser] += 1
+            return self._browser
+
+    async def _release(self, browser: Browser):
+        async with self._lock:
+            self._active[browser] -= 1
+            if browser is not self._browser and self._active[browser] == 0:
+                del self._active[browser]
+                await browser.close()
+
+    @asynccontextmanager
+    async def new_context(self, **kwargs):
+        browser = await self._acquire()
+        try:
+            context: BrowserContext = await browser.new_context(**kwargs)
+            try:
+                yield context
+            finally:
+                # Closing the context (not just the page) frees its driver-side objects
+                await context.close()
+        finally:
+            await self._release(browser)
+
+    async def close(self):
+        async with self._lock:
+            for browser in list(self._active):
+                await browser.close()
+            self._active.clear()
+            self._browser = None
+
+
+# Anything other than letters, digits, space, '-', '_' and '.' is dropped from document filenames
+FILENAME_UNSAFE_RE = re.compile(r'[^\w .-]+')
+
+PROFILE_URL_TEMPLATES = [
+    "{base}/BGVAdmin/Candidate/Preview/{cid}",
+    "{base}/BGVAdmin/Candidate/Details/{cid}",
+    "{base}/Candidate/{cid}",
+    "{base}/api/candidate/{cid}",
+]
+# Profile URL pattern that last loaded successfully; tried first for later candidates
+_resolved_profile_url_template: Optional[str] = None
+
+
+async def process_candidate_via_playwright(page: Page, candidate: Dict, base_url: str, drive: DriveClient, parent_folder: str, doc_bucket: Optional[AsyncTokenBucket] = None) -> Dict:
     """Process candidate using Playwright when API fails"""
     cid = str(candidate.get('CandidateID') or candidate.get('id') or candidate.get('candidateId'))
     name = str(candidate.get('CandidateName') or candidate.get('name') or 'Unknown')
@@ -148,21 +299,22 @@ async def process_candidate_via_playwright(page: Page, candidate: Dict, base_url
     
     try:
         # Navigate to candidate profile/preview page
-        # Try multiple URL patterns
-        profile_urls = [
-            f"{base_url}/BGVAdmin/Candidate/Preview/{cid}",
-            f"{base_url}/BGVAdmin/Candidate/Details/{cid}",
-            f"{base_url}/Candidate/{cid}",
-            f"{base_url}/api/candidate/{cid}",
-        ]
+        # Try the URL pattern that worked for an earlier candidate first, then the rest
+        global _resolved_profile_url_template
+        templates = PROFILE_URL_TEMPLATES
+        if _resolved_profile_url_template:
+            templates = [_resolved_profile_url_template] + [t for t in templates if t != _resolved_profile_url_template]
         
         profile_loaded = False
-        for url in profile_urls:
+        for template in templates:
             try:
-                await page.goto(url, wait_until='networkidle', timeout=30000)
+                url = template.format(base=base_url, cid=cid)
+                # Downloads are triggered by explicit clicks below, so DOM readiness is enough
+                await page.goto(url, wait_until='domcontentloaded', timeout=30000)
                 # Check if page loaded successfully (not error page)
                 if 'error' not in page.url.lower() and 'accessdenied' not in page.url.lower():
                     profile_loaded = True
+                    _resolved_profile_url_template = template
                     break
             except Exception:
                 continue
@@ -170,11 +322,6 @@ async def process_candidate_via_playwright(page: Page, candidate: Dict, base_url
         if not profile_loaded:
             raise Exception("Could not load candidate profile page")
         
-        # Wait for page to load
-        await asyncio.sleep(2)
-        
-        # Try to find and download PIF
-        pif_downloaded = False
         pif_selectors = [
             'a:has-text("PIF")',
             'a:has-text("Personal Information Form")',
@@ -184,6 +331,26 @@ async def process_candidate_via_playwright(page: Page, candidate: Dict, base_url
             '#downloadPIF',
             '.download-pif',
         ]
+        doc_selectors = [
+            'a[href*="download" i]',
+            'button:has-text("Download")',
+            'a[href*=".pdf" i]',
+            'a[href*=".doc" i]',
+            '.document-download',
+            '[data-document-id]',
+        ]
+
+        # Wait for page to load
+        await asyncio.sleep(2)
+        # Links may be rendered by XHR after DOMContentLoaded and the checks below do not wait,
+        # so give the first PIF/document link a moment to appear (profiles without any time out)
+        try:
+            await page.locator(', '.join(pif_selectors + doc_selectors)).first.wait_for(state='visible', timeout=LINKS_READY_TIMEOUT_MS)
+        except PlaywrightTimeoutError:
+            pass
+        
+        # Try to find and download PIF
+        pif_downloaded = False
         
         for sel in pif_selectors:
             try:
@@ -198,7 +365,7 @@ async def process_candidate_via_playwright(page: Page, candidate: Dict, base_url
                     if pif_path.exists() and pif_path.stat().st_size > 100:
                         # Convert PIF to JSON
                         try:
-                            pif_json = pdf_to_json(str(pif_path))
+                            pif_json = await pdf_to_json_async(str(pif_path))
                             (local_dir / 'pif.json').write_text(json.dumps(pif_json, ensure_ascii=False, indent=2))
                         except Exception as e:
                             logger.warning(f"PIF to JSON conversion failed: {e}")
@@ -209,62 +376,54 @@ async def process_candidate_via_playwright(page: Page, candidate: Dict, base_url
         
         # Try to find and download other documents
         documents_downloaded = []
-        doc_selectors = [
-            'a[href*="download" i]',
-            'button:has-text("Download")',
-            'a[href*=".pdf" i]',
-            'a[href*=".doc" i]',
-            '.document-download',
-            '[data-document-id]',
-        ]
         
-        for sel in doc_selectors:
+        try:
+            # One query over all selectors (each matching element is returned once, in DOM order)
+            elements = await page.locator(', '.join(doc_selectors)).all()
+        except Exception:
+            elements = []
+        seen_hrefs = set()
+        used_names = set()
+        # NO LIMIT - download all documents found
+        for idx, element in enumerate(elements):
             try:
-                elements = page.locator(sel).all()
-                # NO LIMIT - download all documents found
-                for idx, element in enumerate(elements):
-                    try:
-                        if await element.is_visible(timeout=2000):
-                            doc_name = await element.get_attribute('href') or await element.text_content() or f"document_{idx+1}"
-                            # Clean filename
-                            doc_name = ''.join(c for c in doc_name if c.isalnum() or c in (' ', '-', '_', '.'))[:50]
-                            if not doc_name.endswith(('.pdf', '.doc', '.docx')):
-                                doc_name += '.pdf'
-                            
-                            async with page.expect_download(timeout=15000) as download_info:
-                                await element.click(force=True)
-                            download = await download_info.value
-                            doc_path = local_dir / 'documents' / doc_name
-                            ensure_dir(doc_path.parent)
-                            await download.save_as(doc_path)
-                            
-                            if doc_path.exists() and doc_path.stat().st_size > 100:
-                                documents_downloaded.append(doc_name)
-                            # Configurable delay between document downloads
-                            await asyncio.sleep(DOCUMENT_DELAY)
-                    except Exception:
+                # expect_download below already times out on dead elements, so no visibility wait here
+                if not await element.is_visible():
+                    continue
+                href = await element.get_attribute('href')
+                if href:
+                    if href in seen_hrefs:
                         continue
+                    seen_hrefs.add(href)
+                
+                # Configurable pacing between document downloads
+                if doc_bucket:
+                    await doc_bucket.acquire()
+                async with page.expect_download(timeout=15000) as download_info:
+                    await element.click(force=True)
+                download = await download_info.value
+                # Named after the server's filename, since distinct hrefs can sanitize to the same name
+                doc_name = FILENAME_UNSAFE_RE.sub('', download.suggested_filename or '').strip() or f"document_{idx+1}"
+                if not doc_name.endswith(('.pdf', '.doc', '.docx')):
+                    doc_name += '.pdf'
+                stem, ext = os.path.splitext(doc_name)
+                n = 1
+                while doc_name in used_names:
+                    n += 1
+                    doc_name = f"{stem}_{n}{ext}"
+                used_names.add(doc_name)
+                doc_path = local_dir / 'documents' / doc_name
+                ensure_dir(doc_path.parent)
+                await download.save_as(doc_path)
+                
+                if doc_path.exists() and doc_path.stat().st_size > 100:
+                    documents_downloaded.append(doc_name)
             except Exception:
                 continue
         
         # Upload to Drive
         folder_id = await drive.ensure_child_folder(parent_folder, folder_name)
-        await drive.upload_file(folder_id, str(details_path), 'application/json')
-        
-        pif_pdf_path = local_dir / 'pif.pdf'
-        if pif_pdf_path.exists():
-            await drive.upload_file(folder_id, str(pif_pdf_path), 'application/pdf')
-            pif_json_path = local_dir / 'pif.json'
-            if pif_json_path.exists():
-                await drive.upload_file(folder_id, str(pif_json_path), 'application/json')
-        
-        # Upload documents
-        documents_dir = local_dir / 'documents'
-        if documents_dir.exists():
-            for doc_file in documents_dir.iterdir():
-                if doc_file.is_file():
-                    mime_type = 'application/pdf' if doc_file.suffix == '.pdf' else 'application/octet-stream'
-                    await drive.upload_file(folder_id, str(doc_file), mime_type)
+        await upload_candidate_files(drive, folder_id, local_dir)
         
         return {
             "candidate_id": cid,
@@ -280,7 +439,7 @@ async def process_candidate_via_playwright(page: Page, candidate: Dict, base_url
         raise
 
 
-async def process_candidate_via_api(candidate: Dict, client: httpx.AsyncClient, headers: Dict, base_url: str, drive: DriveClient, parent_folder: str, api_map: Optional[Dict]) -> Dict:
+async def process_candidate_via_api(candidate: Dict, client: httpx.AsyncClient, headers: Dict, base_url: str, drive: DriveClient, parent_folder: str) -> Dict:
     """Process candidate using API (preferred method)"""
     cid = str(candidate.get('CandidateID') or candidate.get('id') or candidate.get('candidateId'))
     name = str(candidate.get('CandidateName') or candidate.get('name') or 'Unknown')
@@ -294,16 +453,18 @@ async def process_candidate_via_api(candidate: Dict, client: httpx.AsyncClient,
     pif_pdf_path = local_dir / 'pif.pdf'
     pif_downloaded = False
     try:
-        pif_bytes = await download_document_via_api(client, base_url, headers, cid, 'pif', 'PIF', api_map)
-        if pif_bytes and len(pif_bytes) > 100:
-            pif_pdf_path.write_bytes(pif_bytes)
+        pif_size = await download_document_via_api(client, base_url, headers, cid, 'pif', 'PIF', pif_pdf_path)
+        if pif_size and pif_size > 100:
             # Convert to JSON
             try:
-                pif_json = pdf_to_json(str(pif_pdf_path))
+                prefetch_file(pif_pdf_path)
+                pif_json = await pdf_to_json_async(str(pif_pdf_path))
                 (local_dir / 'pif.json').write_text(json.dumps(pif_json, ensure_ascii=False, indent=2))
             except Exception as e:
                 logger.warning(f"PIF to JSON conversion failed: {e}")
             pif_downloaded = True
+        elif pif_size is not None:
+            pif_pdf_path.unlink(missing_ok=True)
     except Exception as e:
         logger.debug(f"PIF API download failed for {cid}: {e}")
 
@@ -333,41 +494,47 @@ async def process_candidate_via_api(candidate: Dict, client: httpx.AsyncClient,
             except Exception:
                 continue
         
-        # Download each document (NO LIMIT - download all documents)
+        # Names come from the API and can repeat (e.g. several "Payslip.pdf"); every document gets
+        # its own file before the concurrent downloads start, so no two streams share a path
+        planned_docs = []
+        used_names = set()
         for doc in doc_list:
-            try:
-                doc_id = str(doc.get('id') or doc.get('docId') or doc.get('documentId'))
-                doc_name = str(doc.get('name') or doc.get('fileName') or f"document_{doc_id}")
-                if not doc_name.endswith(('.pdf', '.doc', '.docx')):
-                    doc_name += '.pdf'
-                
-                doc_bytes = await download_document_via_api(client, base_url, headers, cid, doc_id, doc_name, api_map)
-                if doc_bytes and len(doc_bytes) > 100:
-                    doc_path = documents_dir / doc_name
-                    doc_path.write_bytes(doc_bytes)
-                    documents_downloaded.append(doc_name)
-                    # Configurable delay between document downloads
-                    await asyncio.sleep(DOCUMENT_DELAY)
-            except Exception as e:
-                logger.debug(f"Document {doc.get('id')} download failed: {e}")
+            if not isinstance(doc, dict):
+                continue
+            doc_id = str(doc.get('id') or doc.get('docId') or doc.get('documentId'))
+            doc_name = str(doc.get('name') or doc.get('fileName') or f"document_{doc_id}")
+            if not doc_name.endswith(('.pdf', '.doc', '.docx')):
+                doc_name += '.pdf'
+            stem, ext = os.path.splitext(doc_name)
+            n = 1
+            while doc_name in used_names:
+                n += 1
+                doc_name = f"{stem}_{n}{ext}"
+            used_names.add(doc_name)
+            planned_docs.append((doc_id, doc_name))
+
+        # Download all documents (NO LIMIT) with bounded per-candidate concurrency
+        doc_semaphore = asyncio.Semaphore(MAX_CONCURRENT_DOCUMENTS)
+
+        async def download_one(doc_id: str, doc_name: str):
+            async with doc_semaphore:
+                doc_path = documents_dir / doc_name
+                try:
+                    doc_size = await download_document_via_api(client, base_url, headers, cid, doc_id, doc_name, doc_path)
+                    if doc_size and doc_size > 100:
+                        documents_downloaded.append(doc_name)
+                    elif doc_size is not None:
+                        doc_path.unlink(missing_ok=True)
+                except Exception as e:
+                    logger.debug(f"Document {doc_id} download failed: {e}")
+
+        await asyncio.gather(*(download_one(doc_id, doc_name) for doc_id, doc_name in planned_docs), return_exceptions=True)
     except Exception as e:
         logger.debug(f"Document list fetch failed for {cid}: {e}")
 
     # Upload to Drive
     folder_id = await drive.ensure_child_folder(parent_folder, folder_name)
-    await drive.upload_file(folder_id, str(details_path), 'application/json')
-    if pif_pdf_path.exists():
-        await drive.upload_file(folder_id, str(pif_pdf_path), 'application/pdf')
-        pj = local_dir / 'pif.json'
-        if pj.exists():
-            await drive.upload_file(folder_id, str(pj), 'application/json')
-    
-    # Upload documents
-    if documents_dir.exists():
-        for doc_file in documents_dir.iterdir():
-            if doc_file.is_file():
-                mime_type = 'application/pdf' if doc_file.suffix == '.pdf' else 'application/octet-stream'
-                await drive.upload_file(folder_id, str(doc_file), mime_type)
+    await upload_candidate_files(drive, folder_id, local_dir)
 
     return {
         "candidate_id": cid,
@@ -383,8 +550,7 @@ async def trigger_full_export(session_id: str, storage_state: Optional[Dict], ap
     base_url = 'https://compliancenominationportal.in.pwc.com'
     headers = storage_state_to_cookie_header(storage_state)
 
-    results = []
-    for tab in [
+    tabs = [
         "Today's allocated",
         "Not started",
         "Draft",
@@ -392,112 +558,115 @@ async def trigger_full_export(session_id: str, storage_state: Optional[Dict], ap
         "Submitted",
         "Work in progress",
         "BGV closed",
-    ]:
-        try:
-            r = await export_tab_via_api(tab, base_url, headers, api_map)
-            results.append(r)
-            await asyncio.sleep(1)
-        except Exception as e:
-            results.append({"tab": tab, "status": "error", "error": str(e)})
+    ]
+    # api_map is fixed for the run, so resolve endpoints once up front
+    tab_endpoints = {tab: resolve_endpoint_for_tab(tab, api_map) for tab in tabs}
+
+    # One client for the whole run: keep-alive connections to base_url are reused
+    # across tabs and candidates instead of paying a TLS handshake per task
+    limits = httpx.Limits(
+        max_connections=MAX_CONCURRENT_CANDIDATES * MAX_CONCURRENT_DOCUMENTS,
+        max_keepalive_connections=64,
+    )
+    async with httpx.AsyncClient(timeout=httpx.Timeout(300.0), limits=limits, http2=True) as client, async_playwright() as p:
+        results = []
+        tab_frames: Dict[str, pd.DataFrame] = {}
+        for tab in tabs:
+            try:
+                r, tab_frames[tab] = await export_tab_via_api(client, tab, base_url, headers, tab_endpoints[tab])
+                results.append(r)
+                await asyncio.sleep(1)
+            except Exception as e:
+                results.append({"tab": tab, "status": "error", "error": str(e)})
 
-    # Candidate processing - prefer API, fallback to Playwright
-    drive = DriveClient()
-    parent_folder = drive_folder_id or await drive.ensure_root_folder('PwC Candidates')
-    candidates_processed: List[Dict] = []
-    
-    # Get candidate list from exported Excel files
-    candidate_list = []
-    for tab_file in EXPORT_DIR.glob('*.xlsx'):
+        # Candidate processing - prefer API, fallback to Playwright
+        drive = DriveClient()
+        parent_folder = drive_folder_id or await drive.ensure_root_folder('PwC Candidates')
         try:
-            df = pd.read_excel(tab_file)
-            if 'CandidateID' in df.columns:
-                for _, row in df.iterrows():
-                    candidate_list.append({
-                        'CandidateID': str(row.get('CandidateID', '')),
-                        'CandidateName': str(row.get('CandidateName', row.get('Name', 'Unknown')))
-                    })
+            await drive.warm_folder_cache(parent_folder)
         except Exception as e:
-            logger.debug(f"Could not read candidates from {tab_file}: {e}")
+            logger.debug(f"Could not pre-list candidate folders: {e}")
+        candidates_processed: List[Dict] = []
     
-    # Remove duplicates
-    seen_ids = set()
-    unique_candidates = []
-    for cand in candidate_list:
-        cid = cand.get('CandidateID', '')
-        if cid and cid not in seen_ids:
-            seen_ids.add(cid)
-            unique_candidates.append(cand)
+        # Get unique candidates from the tab frames parsed during export
+        unique_candidates = collect_unique_candidates(tab_frames.values())
     
-    logger.info(f"Found {len(unique_candidates)} unique candidates to process (NO LIMIT - processing all)")
+        logger.info(f"Found {len(unique_candidates)} unique candidates to process (NO LIMIT - processing all)")
     
-    # Process candidates with bounded concurrency for scalability
-    semaphore = asyncio.Semaphore(MAX_CONCURRENT_CANDIDATES)
+        # Process candidates with bounded concurrency for scalability
+        admission = AdmissionController(MAX_CONCURRENT_CANDIDATES)
+
+        # Playwright fallback shares one Chromium (launched on first use); each candidate gets its own context
+        shared_browser = SharedBrowser(p)
     
-    async def process_single_candidate(candidate: Dict, index: int, total: int) -> Dict:
-        """Process a single candidate with semaphore for concurrency control"""
-        async with semaphore:
-            cid = candidate.get('CandidateID', '')
-            if not cid:
-                return {"error": "No CandidateID", "candidate": cid}
+        # Rate limits are paced by token buckets, separately from the concurrency limit
+        candidate_bucket = AsyncTokenBucket(
+            rate=1 / CANDIDATE_DELAY if CANDIDATE_DELAY > 0 else 0,
+            capacity=MAX_CONCURRENT_CANDIDATES,
+        )
+        doc_bucket = AsyncTokenBucket(
+            rate=MAX_CONCURRENT_CANDIDATES / DOCUMENT_DELAY if DOCUMENT_DELAY > 0 else 0,
+            capacity=MAX_CONCURRENT_CANDIDATES,
+        )
+
+        async def process_single_candidate(candidate: Dict, index: int, total: int) -> Dict:
+            """Process a single candidate under the admission controller for concurrency control"""
+            await candidate_bucket.acquire()
+            async with admission:
+                cid = candidate.get('CandidateID', '')
+                if not cid:
+                    return {"error": "No CandidateID", "candidate": cid}
             
-            logger.info(f"🔄 Processing candidate {index+1}/{total}: {cid}")
+                logger.info(f"🔄 Processing candidate {index+1}/{total}: {cid}")
             
-            try:
-                # Try API first
                 try:
-                    async with httpx.AsyncClient(timeout=httpx.Timeout(300.0)) as client:
-                        pr = await process_candidate_via_api(candidate, client, headers, base_url, drive, parent_folder, api_map)
-                    logger.info(f"✅ [{index+1}/{total}] Processed candidate {cid} via API (PIF: {pr.get('pif_downloaded', False)}, Docs: {pr.get('documents_count', 0)})")
-                    return pr
-                except Exception as api_err:
-                    logger.warning(f"⚠️ [{index+1}/{total}] API processing failed for {cid}, trying Playwright: {api_err}")
-                    # Fallback to Playwright
+                    # Try API first
                     try:
-                        async with async_playwright() as p:
-                            browser = await p.chromium.launch(headless=True, args=['--no-sandbox', '--disable-setuid-sandbox'])
-                            context = await browser.new_context(storage_state=storage_state)
-                            page = await context.new_page()
-                            try:
-                                pr = await process_candidate_via_playwright(page, candidate, base_url, drive, parent_folder)
-                                logger.info(f"✅ [{index+1}/{total}] Processed candidate {cid} via Playwright (PIF: {pr.get('pif_downloaded', False)}, Docs: {pr.get('documents_count', 0)})")
-                                return pr
-                            finally:
-                                await browser.close()
-                    except Exception as pw_err:
-                        logger.error(f"❌ [{index+1}/{total}] Both API and Playwright failed for candidate {cid}: {pw_err}")
-                        return {
-                            "candidate_id": cid,
-                            "error": f"API: {api_err}, Playwright: {pw_err}"
-                        }
-            except Exception as ce:
-                logger.exception(f"❌ [{index+1}/{total}] Unexpected error processing candidate {cid}: {ce}")
-                return {"error": str(ce), "candidate": cid}
-            finally:
-                # Rate limiting delay between candidates
-                if index < total - 1:  # Don't delay after last candidate
-                    await asyncio.sleep(CANDIDATE_DELAY)
+                        pr = await process_candidate_via_api(candidate, client, headers, base_url, drive, parent_folder)
+                        logger.info(f"✅ [{index+1}/{total}] Processed candidate {cid} via API (PIF: {pr.get('pif_downloaded', False)}, Docs: {pr.get('documents_count', 0)})")
+                        return pr
+                    except Exception as api_err:
+                        logger.warning(f"⚠️ [{index+1}/{total}] API processing failed for {cid}, trying Playwright: {api_err}")
+                        # Fallback to Playwright
+                        try:
+                            async with shared_browser.new_context(storage_state=storage_state) as context:
+                                page = await context.new_page()
+                                pr = await process_candidate_via_playwright(page, candidate, base_url, drive, parent_folder, doc_bucket)
+                            logger.info(f"✅ [{index+1}/{total}] Processed candidate {cid} via Playwright (PIF: {pr.get('pif_downloaded', False)}, Docs: {pr.get('documents_count', 0)})")
+                            return pr
+                        except Exception as pw_err:
+                            logger.error(f"❌ [{index+1}/{total}] Both API and Playwright failed for candidate {cid}: {pw_err}")
+                            return {
+                                "candidate_id": cid,
+                                "error": f"API: {api_err}, Playwright: {pw_err}"
+                            }
+                except Exception as ce:
+                    logger.exception(f"❌ [{index+1}/{total}] Unexpected error processing candidate {cid}: {ce}")
+                    return {"error": str(ce), "candidate": cid}
     
-    # Process all candidates concurrently (with bounded parallelism)
-    # Each task will create its own HTTP client inside process_single_candidate
-    tasks = [
-        process_single_candidate(candidate, idx, len(unique_candidates))
-        for idx, candidate in enumerate(unique_candidates)
-    ]
-    results = await asyncio.gather(*tasks, return_exceptions=True)
+        # Process all candidates concurrently (with bounded parallelism)
+        # All tasks share the HTTP client so connections to base_url are kept alive
+        tasks = [
+            process_single_candidate(candidate, idx, len(unique_candidates))
+            for idx, candidate in enumerate(unique_candidates)
+        ]
+        results = await asyncio.gather(*tasks, return_exceptions=True)
     
-    # Process results and handle exceptions
-    for result in results:
-        if isinstance(result, Exception):
-            logger.error(f"Task exception: {result}")
-            candidates_processed.append({"error": str(result)})
-        elif isinstance(result, dict):
-            candidates_processed.append(result)
+        # Process results and handle exceptions
+        for result in results:
+            if isinstance(result, Exception):
+                logger.error(f"Task exception: {result}")
+                candidates_processed.append({"error": str(result)})
+            elif isinstance(result, dict):
+                candidates_processed.append(result)
     
-    logger.info(f"✅ Completed processing {len(candidates_processed)} candidates")
+        await shared_browser.close()
+
+        logger.info(f"✅ Completed processing {len(candidates_processed)} candidates")
 
     sheets_result = None
     if spreadsheet_id:
-        sheets_result = await upload_existing_to_sheets(spreadsheet_id)
+        sheets_result = await upload_existing_to_sheets(spreadsheet_id, tab_frames)
 
     return {
         "ok": True,
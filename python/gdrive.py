@@ -1,45 +1,88 @@
 import os
 import asyncio
-from typing import Optional
+import functools
+import threading
+from typing import Optional, Dict, Tuple
+
 from google.oauth2 import service_account
+from google_auth_httplib2 import AuthorizedHttp
 from googleapiclient.discovery import build
-from googleapiclient.http import MediaFileUpload
+from googleapiclient.http import MediaFileUpload, build_http
+
+from utils import google_credentials_info
 
 SCOPES = [
     'https://www.googleapis.com/auth/drive',
 ]
+FOLDER_MIME = 'application/vnd.google-apps.folder'
 
 
-def get_drive_service():
-    creds_json = os.getenv('GOOGLE_CREDENTIALS_JSON')
-    if not creds_json:
-        raise RuntimeError('GOOGLE_CREDENTIALS_JSON not set')
-    creds = service_account.Credentials.from_service_account_info(
-        __import__('json').loads(creds_json), scopes=SCOPES
+@functools.lru_cache(maxsize=1)
+def get_drive_credentials():
+    return service_account.Credentials.from_service_account_info(
+        google_credentials_info(), scopes=SCOPES
     )
-    return build('drive', 'v3', credentials=creds, cache_discovery=False)
+
+
+@functools.lru_cache(maxsize=1)
+def get_drive_service():
+    return build('drive', 'v3', credentials=get_drive_credentials(), cache_discovery=False)
 
 
 class DriveClient:
     def __init__(self):
         self.service = get_drive_service()
+        # (parent_id, name) -> folder id, so repeat lookups skip files().list
+        self._folder_cache: Dict[Tuple[Optional[str], str], str] = {}
+        self._local = threading.local()
+
+    def _execute(self, request):
+        """Execute on the calling worker thread's own connection; httplib2 is not thread-safe"""
+        http = getattr(self._local, 'http', None)
+        if http is None:
+            http = self._local.http = AuthorizedHttp(get_drive_credentials(), http=build_http())
+        return request.execute(http=http)
+
+    async def warm_folder_cache(self, parent_id: str) -> int:
+        """Cache every folder directly under parent_id with paged files().list calls"""
+        params = {
+            'q': f"'{parent_id}' in parents and mimeType = '{FOLDER_MIME}' and trashed = false",
+            'fields': 'nextPageToken, files(id, name)',
+            'spaces': 'drive',
+            'pageSize': 1000
+        }
+        count = 0
+        while True:
+            res = await asyncio.to_thread(self._execute, self.service.files().list(**params))
+            for f in res.get('files', []):
+                self._folder_cache.setdefault((parent_id, f['name']), f['id'])
+                count += 1
+            token = res.get('nextPageToken')
+            if not token:
+                return count
+            params['pageToken'] = token
 
     async def ensure_child_folder(self, parent_id: Optional[str], name: str) -> str:
+        cached = self._folder_cache.get((parent_id, name))
+        if cached:
+            return cached
         params = {
             'q': f"name = '{name}' and mimeType = 'application/vnd.google-apps.folder' and '{parent_id or 'root'}' in parents and trashed = false",
             'fields': 'files(id, name)',
             'spaces': 'drive'
         }
-        res = await asyncio.to_thread(self.service.files().list(**params).execute)
+        res = await asyncio.to_thread(self._execute, self.service.files().list(**params))
         files = res.get('files', [])
         if files:
+            self._folder_cache[(parent_id, name)] = files[0]['id']
             return files[0]['id']
         file_metadata = {
             'name': name,
             'mimeType': 'application/vnd.google-apps.folder',
             'parents': [parent_id] if parent_id else None
         }
-        created = await asyncio.to_thread(self.service.files().create(body=file_metadata, fields='id').execute)
+        created = await asyncio.to_thread(self._execute, self.service.files().create(body=file_metadata, fields='id'))
+        self._folder_cache[(parent_id, name)] = created['id']
         return created['id']
 
     async def ensure_root_folder(self, name: str) -> str:
@@ -48,7 +91,7 @@ class DriveClient:
     async def upload_file(self, parent_id: str, path: str, mime_type: str) -> str:
         media = MediaFileUpload(path, mimetype=mime_type, resumable=True)
         body = {'name': os.path.basename(path), 'parents': [parent_id]}
-        created = await asyncio.to_thread(self.service.files().create(body=body, media_body=media, fields='id').execute)
+        created = await asyncio.to_thread(self._execute, self.service.files().create(body=body, media_body=media, fields='id'))
         return created['id']
 
 
@@ -1,29 +1,38 @@
-import os
+import functools
 from datetime import datetime
-from typing import Dict
+from pathlib import Path
+from typing import Dict, Optional, Set, Union
 
+import numpy as np
 import pandas as pd
 from google.oauth2 import service_account
 from googleapiclient.discovery import build
 
+from utils import google_credentials_info
+
 SCOPES = ['https://www.googleapis.com/auth/spreadsheets']
 
 
+@functools.lru_cache(maxsize=1)
 def get_sheets_service():
-    creds_json = os.getenv('GOOGLE_CREDENTIALS_JSON')
-    if not creds_json:
-        raise RuntimeError('GOOGLE_CREDENTIALS_JSON not set')
     creds = service_account.Credentials.from_service_account_info(
-        __import__('json').loads(creds_json), scopes=SCOPES
+        google_credentials_info(), scopes=SCOPES
     )
     return build('sheets', 'v4', credentials=creds, cache_discovery=False)
 
 
-async def sync_to_sheets_with_audit(tab_name: str, excel_path, spreadsheet_id: str) -> Dict:
+def get_sheet_titles(spreadsheet_id: str) -> Set[str]:
+    meta = get_sheets_service().spreadsheets().get(spreadsheetId=spreadsheet_id, fields='sheets.properties.title').execute()
+    return {s['properties']['title'] for s in meta.get('sheets', [])}
+
+
+async def sync_to_sheets_with_audit(tab_name: str, source: Union[str, Path, pd.DataFrame], spreadsheet_id: str, sheet_titles: Optional[Set[str]] = None) -> Dict:
+    """sheet_titles lets a multi-tab run share one metadata fetch; it is updated if Audit Log gets created"""
     service = get_sheets_service()
     sheets = service.spreadsheets()
 
-    df_new = pd.read_excel(excel_path).fillna('').astype(str)
+    df_new = source if isinstance(source, pd.DataFrame) else pd.read_excel(source)
+    df_new = df_new.fillna('').astype(str)
 
     try:
         sheet_data = (
@@ -50,43 +59,45 @@ async def sync_to_sheets_with_audit(tab_name: str, excel_path, spreadsheet_id: s
 
     key = 'Candidate ID' if 'Candidate ID' in df_new.columns else df_new.columns[0]
 
-    merged = pd.merge(df_existing, df_new, on=key, how='outer', suffixes=('_old','_new'), indicator=True)
+    non_key_cols = [c for c in all_cols if c != key]
+
+    # Sheet row number of the first occurrence of each existing key (row 1 is the header)
+    existing_rownum = pd.Series(df_existing.index + 2, index=df_existing[key])
+    existing_rownum = existing_rownum[~existing_rownum.index.duplicated()]
+    old = df_existing.drop_duplicates(key).set_index(key)[non_key_cols]
+    new = df_new.drop_duplicates(key).set_index(key)[non_key_cols]
+
+    # Appended in key order, as the outer merge this replaced emitted them
+    new_rows = df_new[~df_new[key].isin(old.index)].sort_values(key, kind='stable')
+
+    # Compare the rows present on both sides as whole string arrays, no per-row iteration
+    common = new.index[new.index.isin(old.index)].sort_values()
+    old_arr = np.char.strip(old.loc[common].values.astype(str))
+    new_arr = np.char.strip(new.loc[common].values.astype(str))
+    mask = old_arr != new_arr
+    changed = mask.any(axis=1)
+    changed_keys = common[changed]
+    updated_rows = pd.DataFrame(new_arr[changed], index=changed_keys, columns=non_key_cols).reset_index()[all_cols]
+
+    ts = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    rows, cols = np.where(mask)
+    audit_entries = [
+        [ts, tab_name, common[r], 'UPDATED', non_key_cols[c], str(old_arr[r, c]), str(new_arr[r, c])]
+        for r, c in zip(rows, cols)
+    ]
+
+    # Header (for a fresh tab) and all changed rows go out in a single values.batchUpdate
+    value_ranges = []
+    if not sheet_data:
+        value_ranges.append({'range': f"'{tab_name}'!A1", 'values': [all_cols]})
 
-    right_only = merged[merged['_merge']=='right_only']
-    new_cols = [c for c in merged.columns if c.endswith('_new')] + [key]
-    if new_cols:
-        new_rows = right_only[new_cols].rename(columns={c:c.replace('_new','') for c in new_cols if c.endswith('_new')})
-    else:
-        new_rows = pd.DataFrame(columns=df_new.columns)
-
-    updated_rows = []
-    audit_entries = []
-    both = merged[merged['_merge']=='both']
-    for _, row in both.iterrows():
-        changed = []
-        for c in all_cols:
-            if c == key: continue
-            old = str(row.get(f'{c}_old','')).strip()
-            new = str(row.get(f'{c}_new','')).strip()
-            if old != new:
-                changed.append((c, old, new))
-        if changed:
-            upd = {key: row[key]}
-            for c in all_cols:
-                if c == key: continue
-                upd[c] = str(row.get(f'{c}_new','')).strip()
-            updated_rows.append(upd)
-            for (c, o, n) in changed:
-                audit_entries.append([
-                    datetime.now().strftime('%Y-%m-%d %H:%M:%S'), tab_name, row[key], 'UPDATED', c, o, n
-                ])
+    for rownum, vals in zip(existing_rownum.loc[changed_keys], updated_rows.values.tolist()):
+        value_ranges.append({'range': f"'{tab_name}'!A{rownum}", 'values': [vals]})
 
-    if not sheet_data:
-        sheets.values().update(
+    if value_ranges:
+        sheets.values().batchUpdate(
             spreadsheetId=spreadsheet_id,
-            range=f"'{tab_name}'!A1",
-            valueInputOption='RAW',
-            body={'values':[all_cols]}
+            body={'valueInputOption': 'RAW', 'data': value_ranges}
         ).execute()
 
     if not new_rows.empty:
@@ -98,22 +109,10 @@ async def sync_to_sheets_with_audit(tab_name: str, excel_path, spreadsheet_id: s
             body={'values': new_rows[all_cols].values.tolist()}
         ).execute()
 
-    if updated_rows:
-        df_upd = pd.DataFrame(updated_rows)
-        for _, r in df_upd.iterrows():
-            idx = df_existing[df_existing[key] == r[key]].index
-            if not idx.empty:
-                rownum = idx[0] + 2
-                vals = [str(r.get(c,'')) for c in all_cols]
-                sheets.values().update(
-                    spreadsheetId=spreadsheet_id,
-                    range=f"'{tab_name}'!A{rownum}",
-                    valueInputOption='RAW',
-                    body={'values':[vals]}
-                ).execute()
-
     if audit_entries:
-        try:
+        if sheet_titles is None:
+            sheet_titles = get_sheet_titles(spreadsheet_id)
+        if 'Audit Log' in sheet_titles:
             sheets.values().append(
                 spreadsheetId=spreadsheet_id,
                 range="'Audit Log'!A1",
@@ -121,7 +120,7 @@ async def sync_to_sheets_with_audit(tab_name: str, excel_path, spreadsheet_id: s
                 insertDataOption='INSERT_ROWS',
                 body={'values': audit_entries}
             ).execute()
-        except Exception:
+        else:
             batch = {
                 'requests':[{'addSheet': {'properties': {'title':'Audit Log'}}}]
             }
@@ -134,6 +133,7 @@ async def sync_to_sheets_with_audit(tab_name: str, excel_path, spreadsheet_id: s
                     'values': [["Timestamp","Tab Name","Candidate ID","Action","Column","Old Value","New Value"]] + audit_entries
                 }
             ).execute()
+            sheet_titles.add('Audit Log')
 
     skipped = len(df_existing) - len(updated_rows) if not df_existing.empty else 0
     return {
@@ -1,16 +1,57 @@
 import os
-import json
 import asyncio
+from contextlib import asynccontextmanager, suppress
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from typing import Optional, Dict
+from typing import Optional, Dict, List
 
+import orjson
 from fastapi import FastAPI, HTTPException
-from fastapi.responses import JSONResponse
+from fastapi.responses import ORJSONResponse
 from pydantic import BaseModel, field_validator
 
 from exporter import trigger_full_export
+from pdf_to_json import shutdown_worker_pool
 
-app = FastAPI(title="PwC Hybrid Export Service")
+# Blocking Google API calls run via asyncio.to_thread; size the pool for concurrent uploads
+IO_THREAD_POOL_SIZE = int(os.getenv('IO_THREAD_POOL_SIZE', '64'))
+
+# /health is polled by liveness probes; its timestamp is refreshed once a second instead of per hit
+HEALTH_BODY = {"ok": True, "timestamp": datetime.utcnow().isoformat()}
+
+
+async def _refresh_health_timestamp():
+    while True:
+        HEALTH_BODY["timestamp"] = datetime.utcnow().isoformat()
+        await asyncio.sleep(1)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(max_workers=IO_THREAD_POOL_SIZE))
+    health_ticker = asyncio.create_task(_refresh_health_timestamp())
+    try:
+        yield
+    finally:
+        health_ticker.cancel()
+        with suppress(asyncio.CancelledError):
+            await health_ticker
+        await asyncio.to_thread(shutdown_worker_pool)
+
+
+app = FastAPI(title="PwC Hybrid Export Service", default_response_class=ORJSONResponse, lifespan=lifespan)
+
+
+def _coerce_json(v, name: str):
+    # Dicts (already-decoded JSON bodies) are the common case, so they are checked first
+    if v is None or isinstance(v, dict):
+        return v
+    if isinstance(v, str):
+        try:
+            return orjson.loads(v)
+        except orjson.JSONDecodeError:
+            raise ValueError(f"{name} is not valid JSON")
+    raise ValueError(f"{name} must be dict or JSON string")
 
 
 class TriggerRequest(BaseModel):
@@ -21,62 +62,61 @@ class TriggerRequest(BaseModel):
     @field_validator('storage_state', mode='before')
     @classmethod
     def parse_storage_state(cls, v):
-        if v is None:
-            return None
-        if isinstance(v, str):
-            try:
-                return json.loads(v)
-            except json.JSONDecodeError:
-                raise ValueError("storage_state is not valid JSON")
-        if isinstance(v, dict):
-            return v
-        raise ValueError("storage_state must be dict or JSON string")
+        return _coerce_json(v, 'storage_state')
 
     @field_validator('api_map', mode='before')
     @classmethod
     def parse_api_map(cls, v):
-        if v is None:
-            return None
-        if isinstance(v, str):
-            try:
-                return json.loads(v)
-            except json.JSONDecodeError:
-                raise ValueError("api_map is not valid JSON")
-        if isinstance(v, dict):
-            return v
-        raise ValueError("api_map must be dict or JSON string")
+        return _coerce_json(v, 'api_map')
 
 
-export_lock = asyncio.Lock()
-export_in_progress = False
+# One export at a time; callers arriving while it is held get 429 immediately
+export_sem = asyncio.Semaphore(1)
 
 
 @app.get("/health")
 async def health():
-    return {"ok": True, "timestamp": datetime.utcnow().isoformat()}
+    return HEALTH_BODY
 
 
 @app.post("/trigger-fetch")
 async def trigger_fetch(req: TriggerRequest):
-    global export_in_progress
-    if export_in_progress:
+    if export_sem.locked():
         raise HTTPException(status_code=429, detail="Export already in progress")
 
-    async with export_lock:
-        if export_in_progress:
-            raise HTTPException(status_code=429, detail="Export already in progress")
-        export_in_progress = True
-        try:
-            result = await trigger_full_export(
-                session_id=req.session_id,
-                storage_state=req.storage_state,
-                api_map=req.api_map,
-                spreadsheet_id=os.getenv("GOOGLE_SHEET_ID"),
-                drive_folder_id=os.getenv("GOOGLE_DRIVE_FOLDER_ID")
-            )
-            return JSONResponse(content=result)
-        finally:
-            export_in_progress = False
+    async with export_sem:
+        result = await trigger_full_export(
+            session_id=req.session_id,
+            storage_state=req.storage_state,
+            api_map=req.api_map,
+            spreadsheet_id=os.getenv("GOOGLE_SHEET_ID"),
+            drive_folder_id=os.getenv("GOOGLE_DRIVE_FOLDER_ID")
+        )
+        return ORJSONResponse(content=result)
+
+
+@app.post("/trigger-fetch-batch")
+async def trigger_fetch_batch(reqs: List[TriggerRequest]):
+    if export_sem.locked():
+        raise HTTPException(status_code=429, detail="Export already in progress")
+
+    # Runs share export files and Drive folders, so they execute back to back under one acquisition
+    spreadsheet_id = os.getenv("GOOGLE_SHEET_ID")
+    drive_folder_id = os.getenv("GOOGLE_DRIVE_FOLDER_ID")
+    results = []
+    async with export_sem:
+        for req in reqs:
+            try:
+                results.append(await trigger_full_export(
+                    session_id=req.session_id,
+                    storage_state=req.storage_state,
+                    api_map=req.api_map,
+                    spreadsheet_id=spreadsheet_id,
+                    drive_folder_id=drive_folder_id
+                ))
+            except Exception as e:
+                results.append({"ok": False, "session_id": req.session_id, "error": str(e)})
+        return ORJSONResponse(content={"ok": True, "results": results})
 
 
 @app.post("/upload-to-sheets")
@@ -86,6 +126,6 @@ async def upload_to_sheets():
     if not spreadsheet_id:
         raise HTTPException(status_code=400, detail="GOOGLE_SHEET_ID env not set")
     result = await upload_existing_to_sheets(spreadsheet_id)
-    return JSONResponse(content=result)
+    return ORJSONResponse(content=result)
 
 
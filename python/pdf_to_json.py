@@ -1,70 +1,385 @@
+import asyncio
+import io
+import os
 import re
+import sys
 import json
-from typing import Dict
+import multiprocessing
+import tempfile
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from itertools import islice
+from typing import Callable, Dict, Iterable, Iterator, List, Optional
 
-import pdfplumber
-from PyPDF2 import PdfReader
-from pdf2image import convert_from_path
-import pytesseract
+# pdfplumber, PyPDF2, pdf2image, pytesseract and PIL are imported inside the extractors:
+# they are heavy to load, and a missing OCR stack only disables that fallback
 
+try:
+    import re2
+except ImportError:  # google-re2 unavailable on this platform; parse_fields uses the stdlib scan
+    re2 = None
 
-def extract_text_pdfplumber(path: str) -> str:
+hyperscan = None
+if sys.platform == 'linux':
     try:
-        with pdfplumber.open(path) as pdf:
-            return "\n".join(page.extract_text() or '' for page in pdf.pages)
+        import hyperscan
+    except ImportError:  # optional; parse_fields then uses RE2 or the stdlib scan
+        pass
+
+# PDFs with at least this many pages have their text extracted in parallel
+PARALLEL_MIN_PAGES = int(os.getenv('PDF_PARALLEL_MIN_PAGES', '4'))
+PDF_WORKERS = int(os.getenv('PDF_WORKERS', str(min(8, os.cpu_count() or 1))))
+# Pages per worker task when extracting in parallel; each task reopens the PDF
+PAGES_PER_TASK = 2
+
+# Extracted text is capped at this many characters; pages past the cap are never extracted
+MAX_TEXT_CHARS = 100000
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+def _worker_pool() -> ProcessPoolExecutor:
+    # pdfminer and PyPDF2 are pure Python, so threads would serialize on the GIL
+    # pdf_to_json_async runs on several executor threads, so creation is locked. Workers are not
+    # forked from the threaded server process (executor threads, Playwright pipes, sockets).
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+            _pool = ProcessPoolExecutor(max_workers=PDF_WORKERS, mp_context=multiprocessing.get_context(method))
+    return _pool
+
+
+def _discard_pool(pool: ProcessPoolExecutor) -> None:
+    # A broken pool rejects every later submit, so the next caller must get a fresh one
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def shutdown_worker_pool() -> None:
+    """Stop the PDF worker processes; called when the service shuts down"""
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown(wait=True, cancel_futures=True)
+
+
+def _pool_map(fn: Callable, arg_tuples: List[tuple], window: Optional[int] = None) -> Iterator:
+    """Run fn over arg_tuples in the worker pool, yielding results in order.
+
+    At most `window` items (default: all) are queued at a time and the next one is submitted as
+    each result is taken, so a caller that stops early leaves the rest unstarted rather than done.
+    If a worker dies (e.g. OOM on a huge scan, a tesseract crash) the pool is discarded so later
+    PDFs get a fresh one, and the items it can no longer deliver run in-process instead.
+    """
+    pool = _worker_pool()
+    first_submit = True
+
+    def submit(args: tuple):
+        # Returns None once the pool is gone; that item then runs in-process
+        nonlocal pool, first_submit
+        while pool is not None:
+            try:
+                f = pool.submit(fn, *args)
+                first_submit = False
+                return f
+            except BrokenProcessPool:
+                _discard_pool(pool)
+                # Only a pool that broke while idle since the last PDF is replaced
+                pool = _worker_pool() if first_submit else None
+                first_submit = False
+        return None
+
+    items = iter(arg_tuples)
+    pending = deque()
+    try:
+        for args in islice(items, window or len(arg_tuples)):
+            pending.append((args, submit(args)))
+        while pending:
+            args, f = pending.popleft()
+            try:
+                result = fn(*args) if f is None else f.result()
+            except BrokenProcessPool:
+                if pool is not None:
+                    _discard_pool(pool)
+                    pool = None
+                result = fn(*args)
+            for next_args in islice(items, 1):
+                pending.append((next_args, submit(next_args)))
+            yield result
+    finally:
+        # Items not yet started are dropped once the caller has enough text
+        for _, f in pending:
+            if f is not None:
+                f.cancel()
+
+
+def _join_limited(pages: Iterable[str], limit: int = MAX_TEXT_CHARS) -> str:
+    """Newline-join page texts, pulling no more pages once `limit` characters are collected"""
+    parts = []
+    remaining = limit
+    try:
+        for text in pages:
+            if len(text) >= remaining:
+                parts.append(text[:remaining])
+                break
+            parts.append(text)
+            remaining -= len(text) + 1  # joining newline
+            if remaining <= 0:
+                break
+    finally:
+        close = getattr(pages, 'close', None)
+        if close:
+            close()
+    return "\n".join(parts)
+
+
+def _extract_pages_parallel(extract_range: Callable[[str, int, int], List[str]], path: str, n_pages: int) -> Iterator[str]:
+    """Split pages into small ranges, one in flight per worker so the text cap stops extraction; each task opens its own copy of the PDF"""
+    step = PAGES_PER_TASK
+    ranges = _pool_map(
+        extract_range,
+        [(path, start, min(start + step, n_pages)) for start in range(0, n_pages, step)],
+        window=PDF_WORKERS,
+    )
+    try:
+        for texts in ranges:
+            yield from texts
+    finally:
+        ranges.close()
+
+
+def _pdfplumber_page_range(path: str, start: int, stop: int) -> List[str]:
+    import pdfplumber
+    with pdfplumber.open(path) as pdf:
+        return [page.extract_text() or '' for page in pdf.pages[start:stop]]
+
+
+def _pypdf2_page_range(path: str, start: int, stop: int) -> List[str]:
+    from PyPDF2 import PdfReader
+    reader = PdfReader(path)
+    return [reader.pages[i].extract_text() or '' for i in range(start, stop)]
+
+
+def extract_text_pdfplumber(path: str, data: Optional[bytes] = None) -> str:
+    try:
+        import pdfplumber
+        with pdfplumber.open(io.BytesIO(data) if data is not None else path) as pdf:
+            n_pages = len(pdf.pages)
+            if n_pages < PARALLEL_MIN_PAGES or PDF_WORKERS < 2:
+                return _join_limited(page.extract_text() or '' for page in pdf.pages)
+        return _join_limited(_extract_pages_parallel(_pdfplumber_page_range, path, n_pages))
     except Exception:
         return ''
 
 
-def extract_text_pypdf2(path: str) -> str:
+def extract_text_pypdf2(path: str, data: Optional[bytes] = None) -> str:
     try:
-        reader = PdfReader(path)
-        text = []
-        for page in reader.pages:
-            text.append(page.extract_text() or '')
-        return "\n".join(text)
+        from PyPDF2 import PdfReader
+        reader = PdfReader(io.BytesIO(data) if data is not None else path)
+        n_pages = len(reader.pages)
+        if n_pages < PARALLEL_MIN_PAGES or PDF_WORKERS < 2:
+            return _join_limited(page.extract_text() or '' for page in reader.pages)
+        return _join_limited(_extract_pages_parallel(_pypdf2_page_range, path, n_pages))
     except Exception:
         return ''
 
 
+def _ocr_page_file(image_path: str) -> str:
+    """OCR one rasterized page from disk and delete it, so only in-flight pages are held in memory"""
+    try:
+        import pytesseract
+        from PIL import Image
+        with Image.open(image_path) as img:
+            return pytesseract.image_to_string(img)
+    finally:
+        os.unlink(image_path)
+
+
 def extract_text_ocr(path: str) -> str:
     try:
-        images = convert_from_path(path)
-        parts = []
-        for img in images:
-            parts.append(pytesseract.image_to_string(img))
-        return "\n".join(parts)
+        from pdf2image import convert_from_path
+        with tempfile.TemporaryDirectory(prefix='ocr_') as tmp:
+            # Poppler rasterizes pages in parallel straight to disk; Tesseract then runs one page per worker process
+            page_paths = convert_from_path(path, output_folder=tmp, paths_only=True, fmt='png', thread_count=PDF_WORKERS)
+            if len(page_paths) < 2 or PDF_WORKERS < 2:
+                return _join_limited(_ocr_page_file(p) for p in page_paths)
+            return _join_limited(_pool_map(_ocr_page_file, [(p,) for p in page_paths]))
     except Exception:
         return ''
 
 
-def parse_fields(text: str) -> Dict:
+# (field, label, value) regex bodies; the value is captured after the label and separators.
+# Values that may contain spaces start and end on a non-space, so no stripping is needed; the
+# lone ' ' branch matches where a space-only value used to, and is reported as ''.
+_FIELD_SPECS = [
+    ('CandidateID', r'Candidate\s*ID', r'[A-Za-z0-9\-_/]+'),
+    ('CandidateName', r'Candidate\s*Name|Name', r'[A-Za-z,.](?:[A-Za-z ,.]*[A-Za-z,.])?| '),
+    ('DOB', r'Date\s*of\s*Birth|DOB', r'[0-9]{2,4}[\-/][0-9]{1,2}[\-/][0-9]{1,2}'),
+    ('Employer', r'Employer|Company', r'[A-Za-z0-9&,.](?:[A-Za-z0-9 &,.]*[A-Za-z0-9&,.])?| '),
+    ('Role', r'Role|Designation|Position', r'[A-Za-z0-9&,.](?:[A-Za-z0-9 &,.]*[A-Za-z0-9&,.])?| '),
+    ('Education', r'Education|Qualification', r'[A-Za-z0-9&,.](?:[A-Za-z0-9 &,.]*[A-Za-z0-9&,.])?| '),
+]
+# One alternation scanned once over the text. Each branch is a lookahead so matches do not
+# consume text: a value that runs into the next label (e.g. "Name: X Role: Y") still lets
+# that label match, giving each field its leftmost match exactly as a separate search would.
+# The leading class (first letters of all labels) lets the engine skip other positions cheaply.
+# re.ASCII is deliberately not set: under IGNORECASE the letter classes also match dotless i,
+# dotted I and long s, which keeps names like "Yıldız" whole.
+_FIELD_SCAN = re.compile(
+    r'(?=[cdenpqr])(?:'
+    + '|'.join(rf'(?=(?:{label})\s*[:\-\s]*(?P<{name}>{value}))' for name, label, value in _FIELD_SPECS)
+    + ')',
+    re.IGNORECASE
+)
+
+
+# RE2 matches in linear time (no backtracking on hostile OCR text) but has no lookahead, so
+# under RE2 each field is searched separately. Python's Unicode \s is spelled out because
+# RE2's \s is ASCII-only.
+_RE2_SPACE_CHARS = r'\t-\r\x{1C}-\x{1F}\x{85}\pZ'
+
+
+def _with_dotted_i(label: str) -> str:
+    # Python's IGNORECASE also matches i/I against İ and ı; RE2 and Hyperscan do not
+    return re.sub('[iI]', '[iİı]', label)
+
+
+def _re2_field_source(label: str, value: str) -> str:
+    return (
+        '(?i)(?:' + _with_dotted_i(label).replace(r'\s', '[' + _RE2_SPACE_CHARS + ']') + ')'
+        + '[' + _RE2_SPACE_CHARS + ']*[:\\-' + _RE2_SPACE_CHARS + ']*(' + value.replace('A-Z', 'A-Zİı') + ')'
+    )
+
+
+_RE2_FIELD_PATTERNS = [
+    (name, re2.compile(_re2_field_source(label, value)))
+    for name, label, value in _FIELD_SPECS
+] if re2 else None
+
+
+# Hyperscan finds every label occurrence for all fields in one SIMD pass over the UTF-8 bytes.
+# It reports offsets but no groups, so each label start is confirmed (and its value captured)
+# by the field's RE2 pattern, trying starts in order exactly as a separate re.search would.
+# The patterns run on the same bytes at Hyperscan's offsets, so the text is encoded only once;
+# without RE2 the layer is off, since the stdlib pattern backtracks on long separator runs.
+# Label alternatives are separate expressions since Hyperscan reports one start per end offset;
+# Python's \s and its case folding of i are spelled out.
+_HS_SPACE = r'[\t-\r\x{1C}-\x{20}\x{85}\p{Z}]'
+_HS_FLAGS = (
+    hyperscan.HS_FLAG_CASELESS | hyperscan.HS_FLAG_UTF8 | hyperscan.HS_FLAG_UCP | hyperscan.HS_FLAG_SOM_LEFTMOST
+) if hyperscan else 0
+
+
+def _compile_hyperscan_db():
+    expressions, ids = [], []
+    for idx, (_, label, _) in enumerate(_FIELD_SPECS):
+        for alternative in label.split('|'):
+            expressions.append(_with_dotted_i(alternative).replace(r'\s', _HS_SPACE).encode())
+            ids.append(idx)
+    db = hyperscan.Database()
+    db.compile(expressions=expressions, ids=ids, elements=len(expressions), flags=[_HS_FLAGS] * len(expressions))
+    return db
+
+
+def _compile_utf8_field_patterns():
+    # Bytes patterns are Latin-1 by default in google-re2
+    options = re2.Options()
+    options.encoding = re2.Options.Encoding.UTF8
+    return [
+        (name, re2.compile(_re2_field_source(label, value).encode(), options))
+        for name, label, value in _FIELD_SPECS
+    ]
+
+
+_HS_DB = _compile_hyperscan_db() if hyperscan and re2 else None
+_HS_FIELD_PATTERNS = _compile_utf8_field_patterns() if _HS_DB is not None else None
+# Scratch space cannot be shared by concurrent scans; pdf_to_json_async runs on several threads
+_hs_local = threading.local()
+
+
+def _hs_record_start(idx: int, start: int, end: int, flags: int, starts: List[List[int]]) -> None:
+    starts[idx].append(start)
+
+
+def _parse_fields_hyperscan(text: str) -> Dict:
+    scratch = getattr(_hs_local, 'scratch', None)
+    if scratch is None:
+        scratch = _hs_local.scratch = hyperscan.Scratch(_HS_DB)
+    data = text.encode('utf-8')
+    starts: List[List[int]] = [[] for _ in _FIELD_SPECS]
+    _HS_DB.scan(data, match_event_handler=_hs_record_start, context=starts, scratch=scratch)
     fields = {}
-    patterns = {
-        'CandidateID': r'(Candidate\s*ID)\s*[:\-\s]*([A-Za-z0-9\-_/]+)',
-        'CandidateName': r'(Candidate\s*Name|Name)\s*[:\-\s]*([A-Za-z ,.]+)',
-        'DOB': r'(Date\s*of\s*Birth|DOB)\s*[:\-\s]*([0-9]{2,4}[\-/][0-9]{1,2}[\-/][0-9]{1,2})',
-        'Employer': r'(Employer|Company)\s*[:\-\s]*([A-Za-z0-9 &,.]+)',
-        'Role': r'(Role|Designation|Position)\s*[:\-\s]*([A-Za-z0-9 &,.]+)',
-        'Education': r'(Education|Qualification)\s*[:\-\s]*([A-Za-z0-9 &,.]+)'
-    }
-    for k, pat in patterns.items():
-        m = re.search(pat, text, flags=re.IGNORECASE)
-        if m:
-            fields[k] = m.group(2).strip()
+    for (name, pat), offsets in zip(_HS_FIELD_PATTERNS, starts):
+        for start in sorted(set(offsets)):
+            m = pat.match(data, start)
+            if m:
+                value = m.group(1).decode('utf-8')
+                fields[name] = '' if value == ' ' else value
+                break
     return fields
 
 
+def parse_fields(text: str) -> Dict:
+    if _HS_DB is not None:
+        return _parse_fields_hyperscan(text)
+    if _RE2_FIELD_PATTERNS is not None:
+        fields = {}
+        for name, pat in _RE2_FIELD_PATTERNS:
+            m = pat.search(text)
+            if m:
+                fields[name] = '' if m.group(1) == ' ' else m.group(1)
+        return fields
+    found = {}
+    for m in _FIELD_SCAN.finditer(text):
+        name = m.lastgroup
+        if name not in found:
+            found[name] = '' if m.group(name) == ' ' else m.group(name)
+            if len(found) == len(_FIELD_SPECS):
+                break
+    return {name: found[name] for name, _, _ in _FIELD_SPECS if name in found}
+
+
+# A text layer yielding at least this many fields is good enough to skip the remaining extractors
+MIN_PARSED_FIELDS = int(os.getenv('PDF_MIN_PARSED_FIELDS', '3'))
+
+
 def pdf_to_json(path: str) -> Dict:
-    text = extract_text_pdfplumber(path)
-    if not text.strip():
-        text = extract_text_pypdf2(path)
-    if not text.strip():
+    # Read once and hand the same bytes to each text backend; large PDFs still go to the
+    # worker processes by path, since each would otherwise receive its own pickled copy
+    with open(path, 'rb') as f:
+        data = f.read()
+    text, parsed = '', {}
+    for extract in (extract_text_pdfplumber, extract_text_pypdf2):
+        candidate = extract(path, data)
+        if not candidate.strip():
+            continue
+        candidate_parsed = parse_fields(candidate)
+        if len(candidate_parsed) >= MIN_PARSED_FIELDS:
+            text, parsed = candidate, candidate_parsed
+            break
+        if not text or len(candidate_parsed) > len(parsed):
+            text, parsed = candidate, candidate_parsed
+    # Only the text backends use the bytes; OCR rasterizes from the path, so a large
+    # scan is not held in memory for the whole OCR run
+    del data
+    # OCR is by far the slowest path; only used when the PDF has no text layer at all
+    if not text:
         text = extract_text_ocr(path)
-    parsed = parse_fields(text)
+        parsed = parse_fields(text)
     return {
-        'raw_text': text[:100000],
+        'raw_text': text,
         'parsed': parsed
     }
 
 
+async def pdf_to_json_async(path: str) -> Dict:
+    """Run pdf_to_json in the default executor so extraction and OCR never block the event loop"""
+    return await asyncio.to_thread(pdf_to_json, path)
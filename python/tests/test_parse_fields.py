@@ -0,0 +1,111 @@
+import random
+import re
+import time
+from typing import Dict
+
+import pytest
+
+import pdf_to_json
+
+# parse_fields as originally written: one IGNORECASE search per field, value stripped.
+# Every engine (Hyperscan, RE2, stdlib scan) must give exactly these results.
+ORIGINAL_PATTERNS = {
+    'CandidateID': r'(Candidate\s*ID)\s*[:\-\s]*([A-Za-z0-9\-_/]+)',
+    'CandidateName': r'(Candidate\s*Name|Name)\s*[:\-\s]*([A-Za-z ,.]+)',
+    'DOB': r'(Date\s*of\s*Birth|DOB)\s*[:\-\s]*([0-9]{2,4}[\-/][0-9]{1,2}[\-/][0-9]{1,2})',
+    'Employer': r'(Employer|Company)\s*[:\-\s]*([A-Za-z0-9 &,.]+)',
+    'Role': r'(Role|Designation|Position)\s*[:\-\s]*([A-Za-z0-9 &,.]+)',
+    'Education': r'(Education|Qualification)\s*[:\-\s]*([A-Za-z0-9 &,.]+)',
+}
+
+
+def original_parse_fields(text: str) -> Dict:
+    fields = {}
+    for k, pat in ORIGINAL_PATTERNS.items():
+        m = re.search(pat, text, flags=re.IGNORECASE)
+        if m:
+            fields[k] = m.group(2).strip()
+    return fields
+
+
+SAMPLES = [
+    "Candidate ID: AB-123/4\nCandidate Name: John Smith, Jr.\nDate of Birth: 1990-01-02\n"
+    "Employer: Acme & Co.\nRole: Senior Engineer\nEducation: B.Tech CS",
+    "Name - Jane Doe\nDOB 02/03/1991\nCompany: Foo Ltd\nDesignation: Manager\nQualification: MBA",
+    "Employer: X\nCandidate ID : 77\nPosition: Lead\nName: Bob",
+    "candidate id:   xyz\nname:alice  \n  company:  Big  Corp  \n",
+    "Nothing here",
+    "",
+    "Name:\nRole:\nEducation: \n",
+    "Candidate Name:   Mary Ann   \nCandidate ID:-99\ndob: 2001/1/1 employer: A,B.C",
+    "Educationally speaking, Qualification: PhD Role model Position: CTO",
+    "Name: Yıldız\nPosıtion: LEAD\nQUALİFİCATİON: BSc İstanbul",
+]
+
+# Labels, separators, Unicode spaces (NBSP, em space, \x1c, \x85) and characters that
+# Python's IGNORECASE folds onto ASCII letters (İ, ı, ſ, Kelvin sign)
+WORDS = [
+    'Candidate', 'ID', 'Name', 'CandidateName', 'candidateid', 'DOB', 'DOBirth', 'Date of Birth',
+    'Employer', 'Company', 'Role', 'Designation', 'Position', 'Education', 'Qualification',
+    'Posıtion', 'POSİTION', 'Candıdate', 'İD', 'Poſition', 'Yıldız', 'Şahin', 'Ｎame', 'payroll',
+    ':', '-', ' ', '  ', '\n', '\t', '\xa0', ' ', '　', '\x1c', '\x0b', '\x85',
+    ',', '.', '&', 'abc', 'X Y', 'K', 'ſ', 'é', '1', '12/03/04', '2020-1-1', '1990-01-02',
+]
+
+
+def generated_texts(n: int, seed: int):
+    rnd = random.Random(seed)
+    for _ in range(n):
+        yield ''.join(
+            rnd.choice(WORDS) + rnd.choice(['', ' ', ': ', '  '])
+            for _ in range(rnd.randint(0, 30))
+        )
+
+
+@pytest.fixture(params=['hyperscan', 're2', 'stdlib'])
+def engine(request, monkeypatch):
+    if request.param == 'hyperscan' and pdf_to_json._HS_DB is None:
+        pytest.skip('hyperscan not installed')
+    if request.param == 're2' and pdf_to_json._RE2_FIELD_PATTERNS is None:
+        pytest.skip('google-re2 not installed')
+    if request.param != 'hyperscan':
+        monkeypatch.setattr(pdf_to_json, '_HS_DB', None)
+    if request.param == 'stdlib':
+        monkeypatch.setattr(pdf_to_json, '_RE2_FIELD_PATTERNS', None)
+    return request.param
+
+
+@pytest.mark.parametrize('text', SAMPLES)
+def test_samples_match_original(engine, text):
+    assert pdf_to_json.parse_fields(text) == original_parse_fields(text)
+
+
+def test_generated_texts_match_original(engine):
+    mismatches = [
+        text for text in generated_texts(5000, seed=0)
+        if pdf_to_json.parse_fields(text) != original_parse_fields(text)
+    ]
+    assert not mismatches, f"{len(mismatches)} texts differ, e.g. {mismatches[0]!r}"
+
+
+def test_field_order_follows_specs(engine):
+    parsed = pdf_to_json.parse_fields("Education: MBA\nRole: Lead\nName: Bob\nCandidate ID: 7")
+    assert list(parsed) == ['CandidateID', 'CandidateName', 'Role', 'Education']
+
+
+# Label followed by a long separator run and no value: the original patterns backtrack
+# quadratically here (seconds per text); RE2-backed engines must stay linear
+PATHOLOGICAL = [
+    ('Candidate ID' + ' ' * 20000 + '#', {}),
+    ('Employer' + '\t' * 20000 + '#', {}),
+    ('Name:' + ' -' * 10000 + '\n', {'CandidateName': ''}),
+]
+
+
+@pytest.mark.parametrize('text, expected', PATHOLOGICAL, ids=['spaces', 'tabs', 'separators'])
+def test_pathological_input_is_linear(engine, text, expected):
+    if engine == 'stdlib' or pdf_to_json._RE2_FIELD_PATTERNS is None:
+        pytest.skip('backtracking engine, as slow as the original patterns')
+    start = time.perf_counter()
+    assert pdf_to_json.parse_fields(text) == expected
+    assert time.perf_counter() - start < 1.0
@@ -0,0 +1,60 @@
+import os
+from pathlib import Path
+
+import pytest
+
+import pdf_to_json
+
+
+def _double_outside_parent(parent_pid: int, x: int) -> int:
+    # Simulates a worker killed mid-task (OOM, tesseract crash); runs normally in the parent
+    if os.getpid() != parent_pid:
+        os._exit(1)
+    return x * 2
+
+
+def _double(x: int) -> int:
+    return x * 2
+
+
+def _touch(path: str) -> str:
+    Path(path).touch()
+    return path
+
+
+@pytest.fixture(autouse=True)
+def fresh_pool(monkeypatch):
+    monkeypatch.setattr(pdf_to_json, 'PDF_WORKERS', 2)
+    pdf_to_json.shutdown_worker_pool()
+    yield
+    pdf_to_json.shutdown_worker_pool()
+
+
+def test_pool_map_keeps_order():
+    assert list(pdf_to_json._pool_map(_double, [(i,) for i in range(10)])) == [i * 2 for i in range(10)]
+
+
+def test_window_leaves_later_items_unstarted(tmp_path):
+    results = pdf_to_json._pool_map(_touch, [(str(tmp_path / str(i)),) for i in range(20)], window=2)
+    next(results)
+    results.close()
+    pdf_to_json.shutdown_worker_pool()
+    # Two queued up front plus one submitted when the first result was taken
+    assert len(list(tmp_path.iterdir())) <= 3
+
+
+def test_dead_worker_falls_back_in_process_and_pool_is_replaced():
+    parent = os.getpid()
+    results = list(pdf_to_json._pool_map(_double_outside_parent, [(parent, i) for i in range(6)]))
+    assert results == [i * 2 for i in range(6)]
+    # The broken pool was discarded; the next PDF runs on a fresh one
+    assert list(pdf_to_json._pool_map(_double, [(i,) for i in range(4)])) == [0, 2, 4, 6]
+
+
+def test_shutdown_worker_pool_stops_workers():
+    list(pdf_to_json._pool_map(_double, [(1,), (2,)]))
+    pool = pdf_to_json._pool
+    pdf_to_json.shutdown_worker_pool()
+    assert pdf_to_json._pool is None
+    with pytest.raises(RuntimeError):
+        pool.submit(_double, 1)
@@ -0,0 +1,265 @@
+import asyncio
+import random
+import re
+from datetime import datetime
+from typing import Dict, List
+
+import pandas as pd
+
+import gsheets
+
+
+class FakeHttpError(Exception):
+    pass
+
+
+class FakeSpreadsheet:
+    """In-memory stand-in for the Sheets v4 API: applies every write so final sheet contents can be compared"""
+
+    def __init__(self, sheets: Dict[str, List[List[str]]]):
+        self.sheets = {title: [list(r) for r in rows] for title, rows in sheets.items()}
+        self.calls = []
+
+    # service.spreadsheets() / .values() both return self; method names do not clash
+    def spreadsheets(self):
+        return self
+
+    def values(self):
+        return self
+
+    def _request(self, name, fn):
+        self.calls.append(name)
+        return _Request(fn)
+
+    @staticmethod
+    def _parse(range_: str):
+        m = re.fullmatch(r"'(.+)'!A(\d+)?(?::ZZ)?", range_)
+        return m.group(1), int(m.group(2) or 1)
+
+    def _sheet(self, title):
+        if title not in self.sheets:
+            raise FakeHttpError(f"Unable to parse range: {title}")
+        return self.sheets[title]
+
+    def _write(self, range_, values):
+        title, row = self._parse(range_)
+        sheet = self._sheet(title)
+        for i, vals in enumerate(values):
+            while len(sheet) < row + i:
+                sheet.append([])
+            sheet[row + i - 1] = [str(v) for v in vals]
+
+    def get(self, spreadsheetId, range=None, fields=None):
+        if range is None:
+            return self._request('meta', lambda: {'sheets': [{'properties': {'title': t}} for t in self.sheets]})
+        title, _ = self._parse(range)
+        return self._request('get', lambda: {'values': [list(r) for r in self._sheet(title)]})
+
+    def update(self, spreadsheetId, range, valueInputOption, body):
+        return self._request('update', lambda: self._write(range, body['values']))
+
+    def append(self, spreadsheetId, range, valueInputOption, insertDataOption, body):
+        def run():
+            title, _ = self._parse(range)
+            self._sheet(title).extend([str(v) for v in vals] for vals in body['values'])
+        return self._request('append', run)
+
+    def batchUpdate(self, spreadsheetId, body):
+        def run():
+            if 'requests' in body:
+                for req in body['requests']:
+                    self.sheets.setdefault(req['addSheet']['properties']['title'], [])
+            else:
+                for vr in body['data']:
+                    self._write(vr['range'], vr['values'])
+        return self._request('batchUpdate', run)
+
+
+class _Request:
+    def __init__(self, fn):
+        self.fn = fn
+
+    def execute(self):
+        return self.fn()
+
+
+_original_service = None
+
+
+def get_sheets_service():
+    return _original_service
+
+
+# sync_to_sheets_with_audit as originally written (merge + iterrows, one update per changed row,
+# try/except around the Audit Log append); the only change is taking the DataFrame directly
+async def original_sync_to_sheets_with_audit(tab_name: str, df_source: pd.DataFrame, spreadsheet_id: str) -> Dict:
+    service = get_sheets_service()
+    sheets = service.spreadsheets()
+
+    df_new = df_source.copy().fillna('').astype(str)
+
+    try:
+        sheet_data = (
+            sheets.values()
+            .get(spreadsheetId=spreadsheet_id, range=f"'{tab_name}'!A:ZZ")
+            .execute()
+            .get('values', [])
+        )
+    except Exception:
+        sheet_data = []
+
+    if sheet_data:
+        headers = sheet_data[0]
+        df_existing = pd.DataFrame(sheet_data[1:], columns=headers)
+    else:
+        df_existing = pd.DataFrame(columns=df_new.columns)
+
+    all_cols = list(dict.fromkeys(list(df_existing.columns) + list(df_new.columns)))
+    for c in all_cols:
+        if c not in df_existing.columns: df_existing[c] = ''
+        if c not in df_new.columns: df_new[c] = ''
+    df_existing = df_existing[all_cols].fillna('').astype(str)
+    df_new = df_new[all_cols].fillna('').astype(str)
+
+    key = 'Candidate ID' if 'Candidate ID' in df_new.columns else df_new.columns[0]
+
+    merged = pd.merge(df_existing, df_new, on=key, how='outer', suffixes=('_old','_new'), indicator=True)
+
+    right_only = merged[merged['_merge']=='right_only']
+    new_cols = [c for c in merged.columns if c.endswith('_new')] + [key]
+    if new_cols:
+        new_rows = right_only[new_cols].rename(columns={c:c.replace('_new','') for c in new_cols if c.endswith('_new')})
+    else:
+        new_rows = pd.DataFrame(columns=df_new.columns)
+
+    updated_rows = []
+    audit_entries = []
+    both = merged[merged['_merge']=='both']
+    for _, row in both.iterrows():
+        changed = []
+        for c in all_cols:
+            if c == key: continue
+            old = str(row.get(f'{c}_old','')).strip()
+            new = str(row.get(f'{c}_new','')).strip()
+            if old != new:
+                changed.append((c, old, new))
+        if changed:
+            upd = {key: row[key]}
+            for c in all_cols:
+                if c == key: continue
+                upd[c] = str(row.get(f'{c}_new','')).strip()
+            updated_rows.append(upd)
+            for (c, o, n) in changed:
+                audit_entries.append([
+                    datetime.now().strftime('%Y-%m-%d %H:%M:%S'), tab_name, row[key], 'UPDATED', c, o, n
+                ])
+
+    if not sheet_data:
+        sheets.values().update(
+            spreadsheetId=spreadsheet_id,
+            range=f"'{tab_name}'!A1",
+            valueInputOption='RAW',
+            body={'values':[all_cols]}
+        ).execute()
+
+    if not new_rows.empty:
+        sheets.values().append(
+            spreadsheetId=spreadsheet_id,
+            range=f"'{tab_name}'!A1",
+            valueInputOption='RAW',
+            insertDataOption='INSERT_ROWS',
+            body={'values': new_rows[all_cols].values.tolist()}
+        ).execute()
+
+    if updated_rows:
+        df_upd = pd.DataFrame(updated_rows)
+        for _, r in df_upd.iterrows():
+            idx = df_existing[df_existing[key] == r[key]].index
+            if not idx.empty:
+                rownum = idx[0] + 2
+                vals = [str(r.get(c,'')) for c in all_cols]
+                sheets.values().update(
+                    spreadsheetId=spreadsheet_id,
+                    range=f"'{tab_name}'!A{rownum}",
+                    valueInputOption='RAW',
+                    body={'values':[vals]}
+                ).execute()
+
+    if audit_entries:
+        try:
+            sheets.values().append(
+                spreadsheetId=spreadsheet_id,
+                range="'Audit Log'!A1",
+                valueInputOption='RAW',
+                insertDataOption='INSERT_ROWS',
+                body={'values': audit_entries}
+            ).execute()
+        except Exception:
+            batch = {
+                'requests':[{'addSheet': {'properties': {'title':'Audit Log'}}}]
+            }
+            service.spreadsheets().batchUpdate(spreadsheetId=spreadsheet_id, body=batch).execute()
+            sheets.values().update(
+                spreadsheetId=spreadsheet_id,
+                range="'Audit Log'!A1",
+                valueInputOption='RAW',
+                body={
+                    'values': [["Timestamp","Tab Name","Candidate ID","Action","Column","Old Value","New Value"]] + audit_entries
+                }
+            ).execute()
+
+    skipped = len(df_existing) - len(updated_rows) if not df_existing.empty else 0
+    return {
+        'tab': tab_name,
+        'new_rows': 0 if new_rows is None else len(new_rows),
+        'updated_rows': len(updated_rows),
+        'skipped': max(skipped, 0)
+    }
+
+
+COLUMNS = ['Candidate ID', 'Name', 'City', 'Role']
+CELLS = ['', 'A', 'A ', ' A', 'B', 'Big Corp', 'x y']
+
+
+def random_case(rnd: random.Random):
+    """Existing sheet contents, new export frame and whether Audit Log exists.
+
+    Both sides carry unique Candidate IDs: with duplicate keys the original merge cross-joined
+    rows and wrote one update per pair, while the current code compares the first row per key.
+    """
+    existing_cols = ['Candidate ID'] + [c for c in COLUMNS[1:] if rnd.random() < 0.6]
+    new_cols = ['Candidate ID'] + [c for c in COLUMNS[1:] if rnd.random() < 0.6]
+    keys = [str(k) for k in range(1, 13)]
+    sheet = []
+    if rnd.random() < 0.85:
+        sheet = [existing_cols] + [
+            [k if c == 'Candidate ID' else rnd.choice(CELLS) for c in existing_cols]
+            for k in rnd.sample(keys, rnd.randint(0, 6))
+        ]
+    new = pd.DataFrame(
+        [[k if c == 'Candidate ID' else rnd.choice(CELLS) for c in new_cols] for k in rnd.sample(keys, rnd.randint(1, 6))],
+        columns=new_cols,
+    )
+    return sheet, new, rnd.random() < 0.5
+
+
+def test_matches_original(monkeypatch):
+    global _original_service
+    rnd = random.Random(0)
+    mismatches = []
+    for i in range(1000):
+        sheet, new, audit_exists = random_case(rnd)
+        outcomes = {}
+        for name, fn in (('original', original_sync_to_sheets_with_audit), ('current', gsheets.sync_to_sheets_with_audit)):
+            sheets = {'T': sheet}
+            if audit_exists:
+                sheets['Audit Log'] = [['Timestamp', 'Tab Name', 'Candidate ID', 'Action', 'Column', 'Old Value', 'New Value']]
+            fake = FakeSpreadsheet(sheets)
+            _original_service = fake
+            monkeypatch.setattr(gsheets, 'get_sheets_service', lambda: fake)
+            result = asyncio.run(fn('T', new.copy(), 'sid'))
+            audit = [row[1:] for row in fake.sheets.get('Audit Log', [])[1:]]
+            outcomes[name] = (result, fake.sheets['T'], audit)
+        if outcomes['original'] != outcomes['current']:
+            mismatches.append((i, sheet, new.to_dict('list'), audit_exists, outcomes))
+    assert not mismatches, f"{len(mismatches)} cases differ, e.g. {mismatches[0]}"
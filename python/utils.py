@@ -1,6 +1,9 @@
 import os
 import json
+import time
+import asyncio
 import logging
+import functools
 from pathlib import Path
 from typing import Dict, Optional
 
@@ -9,25 +12,113 @@ logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(
 logger = logging.getLogger('exporter')
 
 
+@functools.lru_cache(maxsize=1)
+def google_credentials_info() -> Dict:
+    """Parse GOOGLE_CREDENTIALS_JSON once; shared by the Drive and Sheets clients"""
+    creds_json = os.getenv('GOOGLE_CREDENTIALS_JSON')
+    if not creds_json:
+        raise RuntimeError('GOOGLE_CREDENTIALS_JSON not set')
+    return json.loads(creds_json)
+
+
 def ensure_dir(p: Path):
     p.mkdir(parents=True, exist_ok=True)
 
 
+def prefetch_file(p: Path):
+    """Hint the kernel to keep a just-written file in page cache before it is re-read"""
+    if not hasattr(os, 'posix_fadvise'):
+        return
+    fd = os.open(p, os.O_RDONLY)
+    try:
+        os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_WILLNEED)
+    finally:
+        os.close(fd)
+
+
+class AsyncTokenBucket:
+    """Paces callers to `rate` acquisitions per second, allowing bursts of up to `capacity`.
+
+    Pacing is independent of concurrency limits: callers wait here before taking a
+    slot, so no slot is held idle just to slow things down. A non-positive or
+    infinite rate disables pacing.
+    """
+
+    def __init__(self, rate: float, capacity: float = 1):
+        self.rate = rate
+        self.capacity = max(capacity, 1)
+        self.tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        if self.rate <= 0 or self.rate == float('inf'):
+            return
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class AdmissionController:
+    """Concurrency limiter whose cap can be changed while tasks are waiting.
+
+    Works like asyncio.Semaphore (`async with controller:`), but the in-flight
+    count and cap are explicit and guarded by a Condition, so set_cap() can
+    raise or lower the limit at runtime (e.g. backing off on upstream 429s).
+    """
+
+    def __init__(self, cap: int):
+        self.active = 0
+        self.cap = cap
+        self._cond = asyncio.Condition()
+
+    async def acquire(self):
+        async with self._cond:
+            await self._cond.wait_for(lambda: self.active < self.cap)
+            self.active += 1
+
+    async def release(self):
+        # The slot is freed before waiting on the lock, and the wake-up is shielded, so a
+        # release cancelled mid-way neither leaks the slot nor leaves a waiter asleep
+        self.active -= 1
+        await asyncio.shield(self._notify_one())
+
+    async def _notify_one(self):
+        async with self._cond:
+            self._cond.notify(1)
+
+    async def set_cap(self, cap: int):
+        async with self._cond:
+            self.cap = cap
+            self._cond.notify_all()
+
+    async def __aenter__(self):
+        await self.acquire()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.release()
+
+
+_STATIC_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120 Safari/537.36',
+    'Accept': 'application/json, text/plain, */*'
+}
+
+
 def storage_state_to_cookie_header(storage_state: Optional[Dict]) -> Dict:
     if not storage_state or 'cookies' not in storage_state:
         raise ValueError('storage_state missing cookies')
-    parts = []
-    for c in storage_state['cookies']:
-        if 'pwc.com' in c.get('domain', ''):
-            parts.append(f"{c['name']}={c['value']}")
-    if not parts:
-        # fallback: include all
-        parts = [f"{c['name']}={c['value']}" for c in storage_state['cookies']]
-    cookie = '; '.join(parts)
-    return {
-        'Cookie': cookie,
-        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120 Safari/537.36',
-        'Accept': 'application/json, text/plain, */*'
-    }
+    cookies = storage_state['cookies']
+    # fallback: include all when no pwc.com cookies are present
+    parts = [f"{c['name']}={c['value']}" for c in cookies if 'pwc.com' in c.get('domain', '')] \
+        or [f"{c['name']}={c['value']}" for c in cookies]
+    return {'Cookie': '; '.join(parts), **_STATIC_HEADERS}
 
 